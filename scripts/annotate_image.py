@@ -6,10 +6,101 @@ Similar to the annotation method used in qwen_description.py
 
 import sys
 import argparse
+import functools
+import shutil
 from pathlib import Path
+from urllib.parse import urlsplit
 from PIL import Image, ImageDraw, ImageFont
 import os
 
+# Fixed JPEG encoder settings: visually lossless, no extra optimize/progressive passes
+JPEG_SUFFIXES = {'.jpg', '.jpeg'}
+JPEG_SAVE_OPTIONS = {'format': 'JPEG', 'quality': 85, 'subsampling': 2, 'optimize': False, 'progressive': False}
+
+# Text box background style
+BOX_RADIUS = 15
+BOX_FILL = (0, 0, 0, 150)
+
+# Chinese-compatible fonts in order of preference (same as qwen_description.py)
+CHINESE_FONT_PATHS = [
+    # Traditional Chinese fonts
+    "/usr/share/fonts/truetype/arphic/uming.ttc",
+    "/usr/share/fonts/truetype/arphic/ukai.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansTC-Bold.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansTC-Bold.ttf",
+    # CJK fonts
+    "/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    # WenQuanYi fonts
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    # Fallback
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+]
+
+
+def _image_suffix(path):
+    """Normalized file extension of a local path or URL (.jpeg is treated as .jpg)"""
+    suffix = Path(urlsplit(path).path).suffix.lower()
+    return '.jpg' if suffix == '.jpeg' else suffix
+
+
+@functools.lru_cache(maxsize=None)
+def _make_corner_tiles(radius, fill):
+    """
+    Rasterize the four rounded corners of a box once
+    Returns (top_left, top_right, bottom_left, bottom_right) RGBA tiles of radius x radius
+    """
+    size = 2 * radius
+    circle = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    ImageDraw.Draw(circle).rounded_rectangle((0, 0, size - 1, size - 1), radius=radius, fill=fill)
+    return (
+        circle.crop((0, 0, radius, radius)),
+        circle.crop((radius, 0, size, radius)),
+        circle.crop((0, radius, radius, size)),
+        circle.crop((radius, radius, size, size)),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font_pair(language):
+    """
+    Resolve and load the (header, body) fonts for a language
+    Cached so font files are probed and parsed once per process; the
+    returned font objects are read-only and safe to share between annotators
+    """
+    if language == "chinese":
+        for font_path in CHINESE_FONT_PATHS:
+            try:
+                if os.path.exists(font_path):
+                    font_header = ImageFont.truetype(font_path, 48)
+                    font_body = ImageFont.truetype(font_path, 40)
+                    print(f"[INFO] Loaded Chinese fonts: {font_path} (header:48px, body:40px)")
+                    return font_header, font_body
+            except Exception:
+                continue
+
+        print("[WARNING] No suitable Chinese font found, using PIL default")
+        print("[INFO] To fix this, install fonts: apt-get install fonts-noto-cjk fonts-wqy-zenhei")
+        return ImageFont.load_default(), ImageFont.load_default()
+
+    # Load English fonts (same as qwen_description.py)
+    try:
+        font_header = ImageFont.truetype("/usr/share/fonts/truetype/msttcorefonts/Trebuchet_MS_Bold.ttf", 48)
+        font_body = ImageFont.truetype("/usr/share/fonts/truetype/Fjord.ttf", 40)
+        print(f"[INFO] Loaded English fonts: Trebuchet_MS_Bold (header:48px), Fjord (body:40px)")
+    except:
+        try:
+            font_header = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 48)
+            font_body = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 40)
+            print(f"[INFO] Loaded English fonts: DejaVuSans-Bold (header:48px), DejaVuSans (body:40px)")
+        except:
+            font_header = ImageFont.load_default()
+            font_body = ImageFont.load_default()
+            print(f"[WARNING] No suitable English font found, using PIL default (very small!)")
+    return font_header, font_body
+
 
 class ImageAnnotator:
     """Simple image annotator for adding text boxes to images"""
@@ -23,61 +114,68 @@ class ImageAnnotator:
         self.language = language.lower()
         self.font_header = None
         self.font_body = None
+        self._session = None  # Created on first URL download, then reused
         self._load_fonts()
+        self._corner_tiles = _make_corner_tiles(BOX_RADIUS, BOX_FILL)
+        # Default output directory, created the first time a default output path is needed
+        self._output_dir = Path("output")
+        self._output_dir_ready = False
+
+    def _make_box_overlay(self, width, height):
+        """
+        Build a rounded semi-transparent box background of the given size
+        Fills the box with a constant color and pastes the precomputed corners,
+        so no arcs are rasterized per box
+        """
+        if width < 2 * BOX_RADIUS or height < 2 * BOX_RADIUS:
+            # Too small for the corner tiles, rasterize directly
+            overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+            ImageDraw.Draw(overlay).rounded_rectangle(
+                (0, 0, width - 1, height - 1),
+                radius=BOX_RADIUS,
+                fill=BOX_FILL
+            )
+            return overlay
+
+        overlay = Image.new('RGBA', (width, height), BOX_FILL)
+        top_left, top_right, bottom_left, bottom_right = self._corner_tiles
+        overlay.paste(top_left, (0, 0))
+        overlay.paste(top_right, (width - BOX_RADIUS, 0))
+        overlay.paste(bottom_left, (0, height - BOX_RADIUS))
+        overlay.paste(bottom_right, (width - BOX_RADIUS, height - BOX_RADIUS))
+        return overlay
+
+    def _get_session(self):
+        """Return a pooled requests.Session so repeated downloads reuse connections"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+        return self._session
 
     def _load_fonts(self):
-        """Load fonts for image annotation"""
-        if self.language == "chinese":
-            # Load Chinese-compatible fonts (same as qwen_description.py)
-            chinese_font_paths = [
-                # Traditional Chinese fonts
-                "/usr/share/fonts/truetype/arphic/uming.ttc",
-                "/usr/share/fonts/truetype/arphic/ukai.ttc",
-                "/usr/share/fonts/opentype/noto/NotoSansTC-Bold.ttf",
-                "/usr/share/fonts/truetype/noto/NotoSansTC-Bold.ttf",
-                # CJK fonts
-                "/usr/share/fonts/truetype/noto/NotoSansCJK-Bold.ttc",
-                "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
-                # WenQuanYi fonts
-                "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
-                "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
-                # Fallback
-                "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-                "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
-            ]
-
-            font_loaded = False
-            for font_path in chinese_font_paths:
-                try:
-                    if os.path.exists(font_path):
-                        self.font_header = ImageFont.truetype(font_path, 48)
-                        self.font_body = ImageFont.truetype(font_path, 40)
-                        font_loaded = True
-                        print(f"[INFO] Loaded Chinese fonts: {font_path} (header:48px, body:40px)")
-                        break
-                except Exception:
-                    continue
-
-            if not font_loaded:
-                print("[WARNING] No suitable Chinese font found, using PIL default")
-                print("[INFO] To fix this, install fonts: apt-get install fonts-noto-cjk fonts-wqy-zenhei")
-                self.font_header = ImageFont.load_default()
-                self.font_body = ImageFont.load_default()
+        """Load fonts for image annotation (resolved once per language, then shared)"""
+        self.font_header, self.font_body = _load_font_pair(self.language)
+
+    def _default_output_path(self, image_path):
+        """Build the default output path for an input image"""
+        from datetime import datetime
+        now = datetime.now()
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
+
+        if image_path.startswith(('http://', 'https://')):
+            output_filename = f"annotated_{timestamp}.jpg"
         else:
-            # Load English fonts (same as qwen_description.py)
-            try:
-                self.font_header = ImageFont.truetype("/usr/share/fonts/truetype/msttcorefonts/Trebuchet_MS_Bold.ttf", 48)
-                self.font_body = ImageFont.truetype("/usr/share/fonts/truetype/Fjord.ttf", 40)
-                print(f"[INFO] Loaded English fonts: Trebuchet_MS_Bold (header:48px), Fjord (body:40px)")
-            except:
-                try:
-                    self.font_header = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 48)
-                    self.font_body = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 40)
-                    print(f"[INFO] Loaded English fonts: DejaVuSans-Bold (header:48px), DejaVuSans (body:40px)")
-                except:
-                    self.font_header = ImageFont.load_default()
-                    self.font_body = ImageFont.load_default()
-                    print(f"[WARNING] No suitable English font found, using PIL default (very small!)")
+            input_filename = Path(image_path).stem
+            output_filename = f"{input_filename}_annotated.jpg"
+
+        if not self._output_dir_ready:
+            self._output_dir.mkdir(exist_ok=True)
+            self._output_dir_ready = True
+        return str(self._output_dir / output_filename)
 
     def annotate_image(self, image_path, text_boxes, output_path=None, auto_layout=True):
         """
@@ -95,19 +193,38 @@ class ImageAnnotator:
         Returns:
             Path to saved annotated image
         """
+        # Nothing to draw: pass the original bytes through instead of decoding and re-encoding
+        if not text_boxes:
+            if output_path is None:
+                output_path = self._default_output_path(image_path)
+            if _image_suffix(image_path) == _image_suffix(output_path):
+                if image_path.startswith(('http://', 'https://')):
+                    response = self._get_session().get(image_path, timeout=30)
+                    response.raise_for_status()
+                    Path(output_path).write_bytes(response.content)
+                else:
+                    shutil.copyfile(image_path, output_path)
+                print(f"[SUCCESS] No annotations, original image copied to: {output_path}")
+                return output_path
+
         # Load image
         if image_path.startswith(('http://', 'https://')):
-            import requests
-            from io import BytesIO
             print(f"[INFO] Downloading image from URL...")
-            response = requests.get(image_path)
-            img = Image.open(BytesIO(response.content))
+            # Stream the body straight into PIL; JPEG/PNG are already compressed
+            with self._get_session().get(image_path, stream=True, timeout=30,
+                                         headers={'Accept-Encoding': 'identity'}) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                img = Image.open(response.raw)
+                img.load()
         else:
             print(f"[INFO] Loading local image file...")
             img = Image.open(image_path)
 
         print(f"[INFO] Image loaded. Size: {img.size}")
         img_width, img_height = img.size
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
         draw = ImageDraw.Draw(img)
 
         # Auto-layout parameters
@@ -136,19 +253,13 @@ class ImageAnnotator:
             else:
                 lines = text
 
-            # Calculate dimensions
-            line_height = 60  # Increased from 42 to match larger font
-            y_offset = position[1]
-            max_width = 0
-            total_height = 0
+            # Font depends only on the box, not the line
+            current_font = self.font_header if is_header else self.font_body
 
-            for line in lines:
-                current_font = self.font_header if is_header else self.font_body
-                bbox = draw.textbbox((position[0], y_offset), line, font=current_font)
-                width = bbox[2] - bbox[0]
-                max_width = max(max_width, width)
-                total_height += line_height
-                y_offset += line_height
+            # Calculate dimensions: every line has a fixed height, so only widths need measuring
+            line_height = 60  # Increased from 42 to match larger font
+            max_width = int(max((current_font.getlength(line) for line in lines), default=0))
+            total_height = len(lines) * line_height
 
             # Draw background rectangle with larger padding
             background_bbox = (
@@ -158,24 +269,17 @@ class ImageAnnotator:
                 position[1] + total_height + 25  # Increased from 20
             )
 
-            # Create semi-transparent overlay
-            overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-            overlay_draw = ImageDraw.Draw(overlay)
-            overlay_draw.rounded_rectangle(
-                background_bbox,
-                radius=15,
-                fill=(0, 0, 0, 150)
-            )
+            # Create a semi-transparent overlay only as large as the box
+            box_width = background_bbox[2] - background_bbox[0] + 1
+            box_height = background_bbox[3] - background_bbox[1] + 1
+            overlay = self._make_box_overlay(box_width, box_height)
 
-            # Composite overlay onto original image
-            img = img.convert('RGBA')
-            img = Image.alpha_composite(img, overlay)
-            draw = ImageDraw.Draw(img)
+            # Blend the overlay in place using its own alpha as the mask
+            img.paste(overlay, background_bbox[:2], overlay)
 
             # Draw the text in white
             y_offset = position[1]
             for line in lines:
-                current_font = self.font_header if is_header else self.font_body
                 draw.text((position[0], y_offset), line, fill=(255, 255, 255), font=current_font)
                 y_offset += line_height
 
@@ -190,22 +294,13 @@ class ImageAnnotator:
 
         # Generate output path if not provided
         if output_path is None:
-            from datetime import datetime
-            now = datetime.now()
-            timestamp = now.strftime('%Y%m%d_%H%M%S')
-
-            if image_path.startswith(('http://', 'https://')):
-                output_filename = f"annotated_{timestamp}.jpg"
-            else:
-                input_filename = Path(image_path).stem
-                output_filename = f"{input_filename}_annotated.jpg"
-
-            output_path = f"output/{output_filename}"
-            Path("output").mkdir(exist_ok=True)
+            output_path = self._default_output_path(image_path)
 
-        # Convert back to RGB and save
-        img = img.convert('RGB')
-        img.save(output_path)
+        # Image is already RGB, save directly (explicit JPEG settings skip format detection)
+        if Path(output_path).suffix.lower() in JPEG_SUFFIXES:
+            img.save(output_path, **JPEG_SAVE_OPTIONS)
+        else:
+            img.save(output_path)
         print(f"[SUCCESS] Annotated image saved to: {output_path}")
 
         return output_path
@@ -3,56 +3,297 @@
 import sys
 import os
 import json
+import functools
+import hashlib
+import logging
+import math
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-import pytz
+from zoneinfo import ZoneInfo
 import yaml
 import requests
-from qwen_description import QwenDescriber
-from image_get import ClockOutReader
-
-PROCESSED_FILE = "processed_images.json"
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from image_get import ClockOutReader, parse_url_timestamp, url_timestamp_digits
+
+PROCESSED_FILE = "processed_images.txt"  # One URL per line, appended as images are processed
+LEGACY_PROCESSED_FILE = "processed_images.json"
+LAST_PROCESSED_TIME_FILE = "last_processed_time.json"
+RESULT_CACHE_DIR = "result_cache"  # Describer results keyed by SHA-256 of the image bytes
+PROCESS_WORKERS = int(os.getenv('PROCESS_WORKERS', '8'))  # Images processed concurrently
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '8'))  # Images downloaded ahead of the workers
+PAGE_FETCH_WORKERS = 4  # Concurrent getClockOutList page requests
+MAX_FETCH_PAGES = int(os.getenv('MAX_FETCH_PAGES', '20'))  # Upper bound on pages fetched per run
+POLL_INTERVAL_SECONDS = float(os.getenv('POLL_INTERVAL_SECONDS', '0'))  # 0 = run once and exit
+# The API start time is this far before the watermark, so rows that reach the API late are still fetched
+WATERMARK_OVERLAP_MINUTES = float(os.getenv('WATERMARK_OVERLAP_MINUTES', '60'))
+
+HONG_KONG_TZ = ZoneInfo('Asia/Hong_Kong')  # GMT+8, resolved once
+
+# Per-image progress goes through a logger so LOG_LEVEL can filter it.
+# Records are written straight to stdout (not buffered) so they stay in order with print() output.
+LOG_LEVEL = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), None)
+if not isinstance(LOG_LEVEL, int):
+    print(f"[WARNING] Unknown LOG_LEVEL {os.getenv('LOG_LEVEL')!r}; using INFO")
+    LOG_LEVEL = logging.INFO
+logger = logging.getLogger("image_description")
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+_log_stream = logging.StreamHandler(sys.stdout)
+_log_stream.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(_log_stream)
+# ClockOutReader debug output (image_get) shares the same handler and level
+_reader_logger = logging.getLogger("image_get")
+_reader_logger.setLevel(LOG_LEVEL)
+_reader_logger.propagate = False
+_reader_logger.addHandler(_log_stream)
+
+# Pooled keep-alive session for posting results
+# Connect errors only: a post that reached the server (timed out, 5xx) may already be stored,
+# and resending it would duplicate the alarm
+POST_HEADERS = {'Content-Type': 'application/json'}
+POST_SESSION = requests.Session()
+_post_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(connect=3, read=0, status=0, other=0)
+)
+POST_SESSION.mount('http://', _post_adapter)
+POST_SESSION.mount('https://', _post_adapter)
+
+# Post bodies are encoded with orjson when it is installed (C encoder, produces bytes directly)
+try:
+    import orjson
+
+    def encode_json(data):
+        return orjson.dumps(data)
+except ImportError:
+    def encode_json(data):
+        return json.dumps(data).encode('utf-8')
+
+# Prefer the libyaml C parser when PyYAML was built with it
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 def load_processed_list(filepath=PROCESSED_FILE):
-    """Load the list of already processed image URLs"""
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-                print(f"[INFO] Loaded {len(data)} processed URLs from {filepath}")
-                return set(data)
-        except Exception as e:
-            print(f"[WARNING] Error loading processed list: {e}")
-            return set()
-    return set()
+    """Load the set of already processed image URLs from the append-only log"""
+    try:
+        with open(filepath, 'r') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return migrate_legacy_processed_list(filepath)
+    except Exception as e:
+        print(f"[WARNING] Error loading processed list: {e}")
+        return set()
+
+    processed_urls = set(filter(None, lines))
+    print(f"[INFO] Loaded {len(processed_urls)} processed URLs from {filepath}")
+    # Compact the log once duplicates make up more than 10% of it
+    if len(lines) - len(processed_urls) > len(lines) // 10:
+        save_processed_list(processed_urls, filepath)
+    return processed_urls
+
+def migrate_legacy_processed_list(filepath=PROCESSED_FILE):
+    """Convert the old JSON list to the log format; returns an empty set if there is none"""
+    try:
+        with open(LEGACY_PROCESSED_FILE, 'r') as f:
+            processed_urls = set(json.load(f))
+    except FileNotFoundError:
+        return set()
+    except Exception as e:
+        print(f"[WARNING] Error loading legacy processed list: {e}")
+        return set()
+
+    print(f"[INFO] Migrating {len(processed_urls)} processed URLs from {LEGACY_PROCESSED_FILE} to {filepath}")
+    save_processed_list(processed_urls, filepath)
+    return processed_urls
 
 def save_processed_list(processed_urls, filepath=PROCESSED_FILE):
-    """Save the list of processed image URLs"""
+    """Rewrite the processed URL log in full (used for migration and compaction)"""
     try:
-        with open(filepath, 'w') as f:
-            json.dump(list(processed_urls), f, indent=2)
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.writelines(f"{url}\n" for url in processed_urls)
+        os.replace(tmp_path, filepath)
         print(f"[INFO] Saved {len(processed_urls)} processed URLs to {filepath}")
         return True
     except Exception as e:
         print(f"[ERROR] Error saving processed list: {e}")
         return False
 
+def prune_processed_urls(processed_urls, cutoff, filepath=PROCESSED_FILE):
+    """
+    Drop URLs captured before cutoff from the in-memory set and the log
+    cutoff is the API start time; such URLs are never returned again.
+    URLs without a timestamp are kept.
+    """
+    cutoff_digits = cutoff.strftime('%Y%m%d%H%M%S')  # Same GMT+8 digits as the URL timestamps
+    expired = set()
+    for url in processed_urls:
+        digits = url_timestamp_digits(url)
+        if digits is not None and digits < cutoff_digits:
+            expired.add(url)
+    if expired:
+        processed_urls -= expired
+        print(f"[INFO] Dropped {len(expired)} processed URLs captured before {cutoff.strftime('%Y-%m-%d %H:%M:%S')}")
+        save_processed_list(processed_urls, filepath)
+
+def load_last_processed_time(filepath=LAST_PROCESSED_TIME_FILE):
+    """Load the capture time up to which every fetched image has been processed"""
+    try:
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+        last_time = datetime.strptime(data['last_processed_time'], "%Y-%m-%d %H:%M:%S").replace(tzinfo=HONG_KONG_TZ)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[WARNING] Error loading last processed time: {e}")
+        return None
+    print(f"[INFO] Loaded last processed time {data['last_processed_time']} from {filepath}")
+    return last_time
+
+def save_last_processed_time(last_time, filepath=LAST_PROCESSED_TIME_FILE):
+    """Save the capture time up to which every fetched image has been processed"""
+    try:
+        with open(filepath, 'w') as f:
+            json.dump({'last_processed_time': last_time.strftime("%Y-%m-%d %H:%M:%S")}, f, indent=2)
+        print(f"[INFO] Saved last processed time {last_time.strftime('%Y-%m-%d %H:%M:%S')} to {filepath}")
+        return True
+    except Exception as e:
+        print(f"[ERROR] Error saving last processed time: {e}")
+        return False
+
+def load_cached_result(image_hash, cache_dir=RESULT_CACHE_DIR):
+    """Return the cached (output_path, labels, ai_text) for an image hash, or None"""
+    try:
+        with open(os.path.join(cache_dir, f"{image_hash}.json"), 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached['output_path'], set(cached['unique_labels']), cached['ai_text']
+
+def save_cached_result(image_hash, output_path, unique_labels, ai_text, cache_dir=RESULT_CACHE_DIR):
+    """Store a describer result under the image hash"""
+    try:
+        tmp_path = os.path.join(cache_dir, f"{image_hash}.json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({'output_path': output_path, 'unique_labels': sorted(unique_labels), 'ai_text': ai_text}, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(cache_dir, f"{image_hash}.json"))
+    except Exception as e:
+        logger.warning("[WARNING] Error caching result for %s: %s", image_hash, e)
+
+def prune_result_cache(max_age_hours, cache_dir=RESULT_CACHE_DIR):
+    """
+    Delete cached results older than max_age_hours
+    Images older than the fetch window are not fetched again, so their results can't be reused
+    """
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    try:
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    continue
+    except OSError as e:
+        logger.warning("[WARNING] Error pruning result cache: %s", e)
+        return
+    if removed:
+        logger.info("[INFO] Removed %d expired cached result(s)", removed)
+
+def get_processed_watermark(all_items, processed_urls):
+    """
+    Latest capture time such that every fetched item at or before it has been processed
+    If an item failed, the watermark stops just before it so it is fetched again next run
+    Returns None (don't advance) while an unprocessed item has no parseable URL timestamp
+    """
+    item_times = [(parse_url_timestamp(item['picUrl']), item['picUrl']) for item in all_items]
+    if any(ts is None and url not in processed_urls for ts, url in item_times):
+        return None
+    item_times = [(ts, url) for ts, url in item_times if ts is not None]
+    if not item_times:
+        return None
+
+    pending_times = [ts for ts, url in item_times if url not in processed_urls]
+    if pending_times:
+        return min(pending_times) - timedelta(seconds=1)
+    return max(ts for ts, url in item_times)
+
+def fetch_all_rows(reader, start_time, end_time):
+    """
+    Fetch every page of the clock out list for the time range
+    Page 1 gives the total row count; the remaining pages are requested concurrently
+    Returns (rows, complete) where complete is False if any page is missing, or (None, False) if page 1 failed
+    """
+    result = reader.get_clockout_list(page_no=1, start_time=start_time, end_time=end_time)
+    if not result or 'data' not in result:
+        return None, False
+
+    rows = list(result['data'].get('rows') or [])
+    total = result['data'].get('total')
+    if total is None:
+        # Without a total we can't tell whether more pages exist
+        return rows, len(rows) < reader.page_size
+
+    n_pages = math.ceil(total / reader.page_size)
+    complete = n_pages <= MAX_FETCH_PAGES
+    if not complete:
+        print(f"[WARNING] {total} rows span {n_pages} pages; fetching the first {MAX_FETCH_PAGES} only")
+        n_pages = MAX_FETCH_PAGES
+
+    if n_pages > 1:
+        print(f"[INFO] Fetching {n_pages - 1} more page(s) of {total} rows")
+        with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as page_pool:
+            pages = page_pool.map(
+                lambda page_no: reader.get_clockout_list(page_no=page_no, start_time=start_time, end_time=end_time),
+                range(2, n_pages + 1)
+            )
+            for page_no, page in enumerate(pages, 2):
+                if page and 'data' in page:
+                    rows.extend(page['data'].get('rows') or [])
+                else:
+                    print(f"[WARNING] Failed to fetch page {page_no}")
+                    complete = False
+    return rows, complete
+
+def update_last_processed_time(fetched_all, all_items, processed_urls, last_processed_time):
+    """Advance and persist the last processed time after a run"""
+    if not fetched_all:
+        # Some rows in the range were not fetched yet; don't skip past them
+        return
+    watermark = get_processed_watermark(all_items, processed_urls)
+    if watermark and (last_processed_time is None or watermark > last_processed_time):
+        save_last_processed_time(watermark)
+
 def post_json_data(json_data, post_url, timeout=10):
     try:
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(post_url, json=json_data, headers=headers, timeout=timeout)
+        response = POST_SESSION.post(post_url, data=encode_json(json_data), headers=POST_HEADERS, timeout=timeout)
         response.raise_for_status()
-        print(f"Successfully posted JSON data to {post_url}")
+        logger.info("Successfully posted JSON data to %s", post_url)
         return True
     except requests.exceptions.RequestException as e:
-        print(f"Failed to post JSON data to {post_url}: {e}")
+        logger.warning("Failed to post JSON data to %s: %s", post_url, e)
         return False
 
 
+@functools.lru_cache(maxsize=4)
+def _parse_model_config(config_path, mtime_ns, size):
+    """Parse the config file; cached per (absolute path, mtime, size) so unchanged files are parsed once"""
+    with open(config_path, 'rb') as f:
+        return yaml.load(f.read(), Loader=YAML_LOADER)
+
+
 def load_model_config(config_path="./config.yaml"):
     try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        return config
+        config_path = os.path.abspath(config_path)
+        stat = os.stat(config_path)
+        return _parse_model_config(config_path, stat.st_mtime_ns, stat.st_size)
     except FileNotFoundError:
         print(f"Config file not found: {config_path}")
         sys.exit(1)
@@ -61,14 +302,26 @@ def load_model_config(config_path="./config.yaml"):
 
         sys.exit(1)
 
+def create_describer(language):
+    """Create a QwenDescriber for the given language"""
+    # Imported here so the model/PIL/OpenAI stack only loads when a describer is needed
+    from qwen_description import QwenDescriber
+    if language == 'chinese':
+        print("[INFO] Using Chinese mode with prompt_chinese.txt")
+        return QwenDescriber(prompt_file='prompt_chinese.txt', language='chinese')
+    print("[INFO] Using English mode with prompt_english.txt")
+    return QwenDescriber(prompt_file='prompt_english.txt', language='english')
+
+# Placeholder pose; constant, so it is built once and shared by every post
+ROBOT_POSE = {"x" : 0,
+              "y" : 0,
+              "z" : 0,
+              "r" : 0,
+              "p" : 0,
+              "yaw" : 0 }
+
 def get_robot_pose():
-    pose = {"x" : 0,
-            "y" : 0,
-            "z" : 0,
-            "r" : 0,
-            "p" : 0,
-            "y" : 0 }
-    return pose
+    return ROBOT_POSE
 
 
 def main():
@@ -115,53 +368,94 @@ def main():
     )
 
     # Initialize unified describer with language setting
-    if language == 'chinese':
-        print("[INFO] Using Chinese mode with prompt_chinese.txt")
-        describer = QwenDescriber(prompt_file='prompt_chinese.txt', language='chinese')
-    else:
-        print("[INFO] Using English mode with prompt_english.txt")
-        describer = QwenDescriber(prompt_file='prompt_english.txt', language='english')
+    # QwenDescriber keeps per-image state, so each worker thread borrows its own instance
+    describer_pool = queue.Queue()
+    describer_pool.put(create_describer(language))
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+
+    # Loaded once; run_once adds each success to it and prunes it
+    processed_urls = load_processed_list()
 
-    # Load configuration
+    if POLL_INTERVAL_SECONDS <= 0:
+        try:
+            status = run_once(reader, describer_pool, processed_urls, language, robot_name, fetch_time_range_hours)
+        finally:
+            reader.close()
+        sys.exit(status)
+
+    # Long-lived worker: reader and describers stay loaded between polls
+    stop_event = threading.Event()
+    def handle_stop(signum, frame):
+        print(f"[INFO] Received signal {signum}, stopping after the current run")
+        stop_event.set()
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    print(f"[INFO] Polling every {POLL_INTERVAL_SECONDS} second(s)")
+    while not stop_event.is_set():
+        try:
+            run_once(reader, describer_pool, processed_urls, language, robot_name, fetch_time_range_hours)
+        except Exception as e:
+            print(f"[ERROR] Run failed: {e}")
+        stop_event.wait(POLL_INTERVAL_SECONDS)
+    reader.close()
+    print("[INFO] Stopped")
+
+
+def run_once(reader, describer_pool, processed_urls, language, robot_name, fetch_time_range_hours):
+    """
+    Fetch, describe and post one batch of new images; returns the exit status
+    processed_urls is the set of processed URLs, updated in place
+    """
+    # Load configuration (re-parsed only when the file changes)
     config = load_model_config()
 
     # Get API configuration
     api_config = config.get("api", {})
     post_endpoint = api_config.get("post_endpoint", "http://post-server:8080/api/detections")
     api_timeout = api_config.get("timeout", 10)
-
-    # Create output directories
-    hong_kong_tz = pytz.timezone('Asia/Hong_Kong')
+    # Server accepts all labels of an image in one post as a "detections" list
+    batch_detections = api_config.get("batch_detections", False)
 
     robot = robot_name
     camera = "front_camera"
 
-    current_time = datetime.now(hong_kong_tz)
+    current_time = datetime.now(HONG_KONG_TZ)
     start_time = current_time - timedelta(hours=fetch_time_range_hours)
 
+    # Keep the result cache bounded to what the fetch window can return again
+    prune_result_cache(fetch_time_range_hours)
+
+    # Only ask the server for rows newer than what has already been processed, less an overlap
+    # margin for rows that show up late; the processed set drops the ones already handled
+    last_processed_time = load_last_processed_time()
+    if last_processed_time:
+        start_time = max(start_time, last_processed_time - timedelta(minutes=WATERMARK_OVERLAP_MINUTES))
+
     print(f"[INFO] Processing images from: {start_time.strftime('%Y-%m-%d %H:%M:%S')} to {current_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
-    # Load previously processed URLs
-    processed_urls = load_processed_list()
+    # URLs captured before the query start can't come back, so they no longer need tracking
+    prune_processed_urls(processed_urls, start_time)
 
-    # Fetch clock out list for the specified time range
-    result = reader.get_clockout_list(page_no=1, start_time=start_time, end_time=current_time)
+    # Fetch clock out list for the specified time range (all pages)
+    rows, fetched_all = fetch_all_rows(reader, start_time, current_time)
 
-    if not result:
+    if rows is None:
         print("[WARNING] No data received from API")
-        sys.exit(0)
-
-    # Extract all data items from the result (including location data)
-    all_items = []
-    if result and 'data' in result and 'rows' in result['data']:
-        for row in result['data']['rows']:
-            if 'picUrl' in row:
-                all_items.append({
-                    'picUrl': row['picUrl'],
-                    'lon': row.get('lon'),
-                    'lat': row.get('lat'),
-                    'clockOutPlace': row.get('clockOutPlace')
-                })
+        return 0
+
+    # Extract all data items from the rows (including location data)
+    # Keyed by picUrl so a URL listed more than once is only processed once (last row wins)
+    unique_rows = {row['picUrl']: row for row in rows if 'picUrl' in row}
+    all_items = [
+        {
+            'picUrl': url,
+            'lon': row.get('lon'),
+            'lat': row.get('lat'),
+            'clockOutPlace': row.get('clockOutPlace')
+        }
+        for url, row in unique_rows.items()
+    ]
 
     print(f"[INFO] Found {len(all_items)} total items in response")
 
@@ -170,38 +464,99 @@ def main():
     print(f"[INFO] {len(unprocessed_items)} new items to process ({len(all_items) - len(unprocessed_items)} already processed)")
 
     if len(unprocessed_items) == 0:
-        print("[INFO] No new URLs to process. Exiting.")
-        sys.exit(0)
+        update_last_processed_time(fetched_all, all_items, processed_urls, last_processed_time)
+        print("[INFO] No new URLs to process.")
+        return 0
 
     processed_count = 0
     failed_count = 0
     post_success_count = 0
     post_failed_count = 0
 
-    # Process each unprocessed item
-    for idx, item in enumerate(unprocessed_items, 1):
+    # Grow the describer pool on demand; instances are kept for later runs
+    for _ in range(min(PROCESS_WORKERS, len(unprocessed_items)) - describer_pool.qsize()):
+        describer_pool.put(create_describer(language))
+
+    # Download images ahead of the workers (sliding window) so inference never waits on the network
+    from qwen_llm import load_image_bytes
+    download_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+    download_futures = {}
+    prefetch_window = PROCESS_WORKERS + PREFETCH_WORKERS
+
+    def schedule_download(index):
+        if index < len(unprocessed_items):
+            pic_url = unprocessed_items[index]['picUrl']
+            download_futures[pic_url] = download_pool.submit(load_image_bytes, pic_url)
+
+    for index in range(prefetch_window):
+        schedule_download(index)
+
+    def process_item(idx, item):
+        url = item['picUrl']
+        logger.info("[PROCESSING] (%d/%d) %s", idx, len(unprocessed_items), url)
+        image_bytes = None
+        download = download_futures.pop(url, None)
+        if download is not None:
+            try:
+                image_bytes = download.result()
+            except Exception as download_error:
+                # process_and_annotate will retry the download itself
+                logger.warning("[WARNING] Prefetch failed for %s: %s", url, download_error)
+
+        # The same image can come back under a different URL; reuse its result instead of re-running the model
+        image_hash = None
+        if image_bytes is not None:
+            image_hash = hashlib.sha256(image_bytes).hexdigest()
+            cached = load_cached_result(image_hash)
+            if cached is not None:
+                logger.info("[INFO] Reusing cached result for %s", url)
+                return cached
+
+        worker_describer = describer_pool.get()
         try:
-            url = item['picUrl']
-            print(f"[PROCESSING] ({idx}/{len(unprocessed_items)}) {url}")
-
-            output_path = describer.process_and_annotate(url)
+            if image_bytes is not None:
+                output_path = worker_describer.process_and_annotate_bytes(image_bytes, url)
+            else:
+                output_path = worker_describer.process_and_annotate(url)
+            unique_labels = set(worker_describer.unique_labels)
+            ai_text = worker_describer.ai_text
+        finally:
+            describer_pool.put(worker_describer)
+
+        if image_hash is not None and output_path:
+            save_cached_result(image_hash, output_path, unique_labels, ai_text)
+        return output_path, unique_labels, ai_text
+
+    # Process unprocessed items concurrently; results are handled here as they complete
+    with ThreadPoolExecutor(max_workers=PROCESS_WORKERS) as executor, \
+            open(PROCESSED_FILE, 'a') as processed_log:
+        future_to_item = {
+            executor.submit(process_item, idx, item): item
+            for idx, item in enumerate(unprocessed_items, 1)
+        }
 
-            # Add to processed set immediately after success
-            processed_urls.add(url)
-            processed_count += 1
-            print(f"[SUCCESS] Processed: {url}")
+        for completed, future in enumerate(as_completed(future_to_item)):
+            # Keep the download window full as items finish
+            schedule_download(prefetch_window + completed)
 
-            # Post to server immediately after annotation completion
+            item = future_to_item[future]
+            url = item['picUrl']
             try:
-                annotation_time = datetime.now(hong_kong_tz)
-
-                # Determine how many posts to send based on unique_labels
-                if len(describer.unique_labels) == 0:
-                    # No detections - send single post with ai_description
-                    print(f"[INFO] No detections found. Sending single post with model_type: ai_description")
+                output_path, unique_labels, ai_text = future.result()
+
+                # Add to processed set and log immediately after success
+                processed_urls.add(url)
+                processed_log.write(f"{url}\n")
+                processed_log.flush()
+                processed_count += 1
+                logger.info("[SUCCESS] Processed: %s", url)
+
+                # Post to server immediately after annotation completion
+                try:
+                    # Fields shared by every post for this image; only model_type varies
                     post_data = {
                         "model_type": "ai_description",
-                        "time": annotation_time.strftime("%Y-%m-%d %H:%M:%S"),
+                        "time": datetime.now(HONG_KONG_TZ).strftime("%Y-%m-%d %H:%M:%S"),
                         "robot": robot,
                         "camera": camera,
                         "pose": get_robot_pose(),
@@ -209,51 +564,56 @@ def main():
                         "lon": item.get('lon'),
                         "lat": item.get('lat'),
                         "clockOutPlace": item.get('clockOutPlace'),
-                        "aiText": describer.ai_text  # Add AI-generated text description
+                        "aiText": ai_text  # Add AI-generated text description
                     }
-                    if post_json_data(post_data, post_endpoint, timeout=api_timeout):
-                        post_success_count += 1
-                        print(f"[SUCCESS] Posted annotation to server: {output_path}")
-                    else:
-                        post_failed_count += 1
-                        print(f"[WARNING] Failed to post annotation to server: {output_path}")
-                else:
-                    # One or more detections - send one post per unique label
-                    print(f"[INFO] Found {len(describer.unique_labels)} unique detection(s). Sending post for each label.")
-                    for label in describer.unique_labels:
-                        post_data = {
-                            "model_type": label,
-                            "time": annotation_time.strftime("%Y-%m-%d %H:%M:%S"),
-                            "robot": robot,
-                            "camera": camera,
-                            "pose": get_robot_pose(),
-                            "image_path": [output_path],  # Single image path in array
-                            "lon": item.get('lon'),
-                            "lat": item.get('lat'),
-                            "clockOutPlace": item.get('clockOutPlace'),
-                            "aiText": describer.ai_text  # Add AI-generated text description
-                        }
+
+                    # Determine how many posts to send based on unique_labels
+                    if len(unique_labels) == 0:
+                        # No detections - send single post with ai_description
+                        logger.info("[INFO] No detections found. Sending single post with model_type: ai_description")
                         if post_json_data(post_data, post_endpoint, timeout=api_timeout):
                             post_success_count += 1
-                            print(f"[SUCCESS] Posted annotation with model_type '{label}' to server: {output_path}")
+                            logger.info("[SUCCESS] Posted annotation to server: %s", output_path)
                         else:
                             post_failed_count += 1
-                            print(f"[WARNING] Failed to post annotation with model_type '{label}' to server: {output_path}")
-
-            except Exception as post_error:
-                post_failed_count += 1
-                print(f"[ERROR] Error posting to server: {post_error}")
-
-        except Exception as e:
-            print(f"[ERROR] Failed processing {url}: {e}")
-            failed_count += 1
-
-    # Save updated processed list
-    save_processed_list(processed_urls)
-
-    print(f"[INFO] Processing complete: {processed_count} successful, {failed_count} failed")
-    print(f"[INFO] Server posting: {post_success_count} successful, {post_failed_count} failed")
-    sys.exit(0)
+                            logger.warning("[WARNING] Failed to post annotation to server: %s", output_path)
+                    elif batch_detections:
+                        # One or more detections - send all labels in a single post
+                        logger.info("[INFO] Found %d unique detection(s). Sending one batched post.", len(unique_labels))
+                        del post_data["model_type"]
+                        post_data["detections"] = [{"model_type": label} for label in unique_labels]
+                        if post_json_data(post_data, post_endpoint, timeout=api_timeout):
+                            post_success_count += 1
+                            logger.info("[SUCCESS] Posted %d detection(s) to server: %s", len(unique_labels), output_path)
+                        else:
+                            post_failed_count += 1
+                            logger.warning("[WARNING] Failed to post detections to server: %s", output_path)
+                    else:
+                        # One or more detections - send one post per unique label
+                        logger.info("[INFO] Found %d unique detection(s). Sending post for each label.", len(unique_labels))
+                        for label in unique_labels:
+                            post_data["model_type"] = label
+                            if post_json_data(post_data, post_endpoint, timeout=api_timeout):
+                                post_success_count += 1
+                                logger.info("[SUCCESS] Posted annotation with model_type '%s' to server: %s", label, output_path)
+                            else:
+                                post_failed_count += 1
+                                logger.warning("[WARNING] Failed to post annotation with model_type '%s' to server: %s", label, output_path)
+
+                except Exception as post_error:
+                    post_failed_count += 1
+                    logger.error("[ERROR] Error posting to server: %s", post_error)
+
+            except Exception as e:
+                logger.error("[ERROR] Failed processing %s: %s", url, e)
+                failed_count += 1
+
+    download_pool.shutdown(wait=False)
+    update_last_processed_time(fetched_all, all_items, processed_urls, last_processed_time)
+
+    logger.info("[INFO] Processing complete: %d successful, %d failed", processed_count, failed_count)
+    logger.info("[INFO] Server posting: %d successful, %d failed", post_success_count, post_failed_count)
+    return 0
 
 if __name__=="__main__":
     main()
\ No newline at end of file
@@ -3,20 +3,63 @@
 import sys
 import os
 import argparse
+import json
+import logging
+import functools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 import yaml
 import requests
-from qwen_description import QwenDescriber
+from requests.adapters import HTTPAdapter
+
+HONG_KONG_TZ = ZoneInfo('Asia/Hong_Kong')  # GMT+8, resolved once
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)  # libyaml parser when available
+PREFETCH_DEPTH = 2  # Images read ahead of the describers
+
+# Per-image progress goes through a logger so -v can add DEBUG output.
+# Records are written straight to stdout (not buffered) so they stay in order with print() output.
+logger = logging.getLogger("image_description_local")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_stream = logging.StreamHandler(sys.stdout)
+_log_stream.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(_log_stream)
+
+# Pooled keep-alive session so posts reuse the TCP/TLS connection to the server
+POST_HEADERS = {'Content-Type': 'application/json'}
+POST_SESSION = requests.Session()
+_post_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+POST_SESSION.mount('http://', _post_adapter)
+POST_SESSION.mount('https://', _post_adapter)
+
+# Post bodies are encoded with orjson when it is installed (C encoder, produces bytes directly)
+try:
+    import orjson
+
+    def encode_json(data):
+        return orjson.dumps(data)
+except ImportError:
+    def encode_json(data):
+        return json.dumps(data).encode('utf-8')
+
+
+@functools.lru_cache(maxsize=4)
+def _parse_config(config_path, mtime_ns, size):
+    """Parse the config file; cached per (absolute path, mtime, size) so unchanged files are parsed once"""
+    with open(config_path, 'rb') as f:
+        return yaml.load(f.read(), Loader=YAML_LOADER)
 
 
 def load_config(config_path="./config.yaml"):
     """Load configuration from YAML file"""
     try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        return config
+        config_path = os.path.abspath(config_path)
+        stat = os.stat(config_path)
+        return _parse_config(config_path, stat.st_mtime_ns, stat.st_size) or {}
     except FileNotFoundError:
         print(f"[WARNING] Config file not found: {config_path}")
         return {}
@@ -28,27 +71,50 @@ def load_config(config_path="./config.yaml"):
 def post_json_data(json_data, post_url, timeout=10):
     """Post JSON data to server"""
     try:
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(post_url, json=json_data, headers=headers, timeout=timeout)
+        response = POST_SESSION.post(post_url, data=encode_json(json_data), headers=POST_HEADERS, timeout=timeout)
         response.raise_for_status()
-        print(f"[SUCCESS] Posted data to {post_url}")
+        logger.info("[SUCCESS] Posted data to %s", post_url)
         return True
     except requests.exceptions.RequestException as e:
-        print(f"[ERROR] Failed to post data to {post_url}: {e}")
+        logger.error("[ERROR] Failed to post data to %s: %s", post_url, e)
         return False
 
 
+# Placeholder pose; constant, so it is built once and shared by every post
+ROBOT_POSE = {
+    "x": 0,
+    "y": 0,
+    "z": 0,
+    "r": 0,
+    "p": 0,
+    "yaw": 0
+}
+
+
+def read_image_bytes(image_path):
+    """Read an image file's raw bytes"""
+    with open(image_path, 'rb') as f:
+        return f.read()
+
+
+def get_output_path(image_path, output_dir):
+    """Output path for an annotated image in output_dir, or None to use the describer's default location"""
+    if not output_dir:
+        return None
+
+    # Get input filename and add _annotated suffix (plain string ops; called once per image)
+    base, dot, ext = os.path.basename(image_path).rpartition('.')
+    if dot:
+        output_filename = f"{base}_annotated.{ext}"
+    else:
+        output_filename = f"{ext}_annotated.jpg"
+
+    return os.path.join(output_dir, output_filename)
+
+
 def get_robot_pose():
     """Get robot pose (placeholder)"""
-    pose = {
-        "x": 0,
-        "y": 0,
-        "z": 0,
-        "r": 0,
-        "p": 0,
-        "y": 0
-    }
-    return pose
+    return ROBOT_POSE
 
 
 def get_image_files(input_path):
@@ -78,14 +144,16 @@ def get_image_files(input_path):
             return []
 
     elif path.is_dir():
-        # Directory - get all image files
-        image_files = []
-        for ext in supported_formats:
-            image_files.extend(path.glob(f"*{ext}"))
-            image_files.extend(path.glob(f"*{ext.upper()}"))
+        # Directory - get all image files in a single listing pass
+        # DirEntry carries the file type from readdir, so regular files need no extra stat
+        with os.scandir(path) as entries:
+            image_files = [
+                entry.path for entry in entries
+                if os.path.splitext(entry.name)[1].lower() in supported_formats and entry.is_file()
+            ]
 
         # Sort by name
-        image_files = sorted([str(f) for f in image_files])
+        image_files.sort()
         print(f"[INFO] Found {len(image_files)} image files in {input_path}")
         return image_files
 
@@ -130,6 +198,9 @@ Examples:
   # Right-align text boxes on images
   python image_description_chinese_local.py images/ --text-alignment right
 
+  # Annotate four images at a time
+  python image_description_chinese_local.py images/ --batch-size 4
+
   # Enable verbose mode
   python image_description_chinese_local.py images/ -v --post-to-server
         """
@@ -198,7 +269,23 @@ Examples:
         default='left'
     )
 
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        help='Number of images annotated concurrently (default: 1)',
+        default=1
+    )
+
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='List the images that would be processed and exit without loading the model'
+    )
+
     args = parser.parse_args()
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    args.batch_size = max(1, args.batch_size)
 
     # Load configuration
     config = load_config(args.config)
@@ -226,77 +313,138 @@ Examples:
             print(f"[INFO] Robot name: {args.robot_name}")
             print(f"[INFO] Camera name: {args.camera_name}")
 
-    # Initialize describer
+    if args.dry_run:
+        for image_path in image_files:
+            print(image_path)
+        sys.exit(0)
+
+    # Initialize describers (imported only now so --help and --dry-run stay fast)
+    # QwenDescriber keeps per-image state, so each image in a batch borrows its own instance
+    describer_pool = queue.Queue()
     try:
-        describer = QwenDescriber(
-            detection_objects=args.detection_objects,
-            prompt_file=args.prompt_file,
-            text_alignment=args.text_alignment
-        )
+        from qwen_description import QwenDescriber
+        for _ in range(min(args.batch_size, len(image_files))):
+            describer_pool.put(QwenDescriber(
+                detection_objects=args.detection_objects,
+                prompt_file=args.prompt_file,
+                text_alignment=args.text_alignment
+            ))
     except Exception as e:
         print(f"[ERROR] Failed to initialize describer: {e}")
         sys.exit(1)
 
+    # Read image files ahead of the describers on one background thread (sliding window)
+    read_pool = ThreadPoolExecutor(max_workers=1)
+    image_reads = {}
+    image_reads_lock = threading.Lock()
+    next_read = 0
+    prefetch_window = args.batch_size + PREFETCH_DEPTH
+
+    def schedule_reads(end):
+        """Submit reads for every image before index end that hasn't been scheduled yet"""
+        nonlocal next_read
+        with image_reads_lock:
+            while next_read < min(end, len(image_files)):
+                image_reads[next_read] = read_pool.submit(read_image_bytes, image_files[next_read])
+                next_read += 1
+
+    def describe(index, output_path):
+        # The read-ahead window follows the workers, which may run ahead of the reporting loop
+        schedule_reads(index + prefetch_window)
+        with image_reads_lock:
+            image_read = image_reads.pop(index, None)
+        image_bytes = image_read.result() if image_read is not None else read_image_bytes(image_files[index])
+        describer = describer_pool.get()
+        try:
+            result_path = describer.process_and_annotate_bytes(image_bytes, image_files[index], output_path=output_path)
+            return result_path, describer.ai_text
+        finally:
+            describer_pool.put(describer)
+
+    # Determine output paths if an output directory is specified
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    image_output_paths = [get_output_path(image_path, args.output_dir) for image_path in image_files]
+
+    # Annotate up to batch_size images concurrently; results are reported in input order
+    schedule_reads(prefetch_window)
+    executor = ThreadPoolExecutor(max_workers=args.batch_size)
+    descriptions = [
+        executor.submit(describe, index, output_path)
+        for index, output_path in enumerate(image_output_paths)
+    ]
+
+    # Posts are sent one at a time by a background worker so the loop never waits on the server
+    post_queue = queue.Queue()
+    post_results = []
+
+    def post_worker():
+        while True:
+            post_data = post_queue.get()
+            if post_data is None:
+                return
+            post_results.append(post_json_data(post_data, post_endpoint, timeout=api_timeout))
+
+    # Fields that are the same for every post; per-image fields are filled into a copy
+    post_template = {
+        "model_type": "ai_description",
+        "time": None,
+        "robot": args.robot_name,
+        "camera": args.camera_name,
+        "pose": get_robot_pose(),
+        "image_path": None,
+        "aiText": None
+    }
+
+    post_thread = None
+    if args.post_to_server:
+        post_thread = threading.Thread(target=post_worker, daemon=True)
+        post_thread.start()
+
+    # /home/data copy directories already created this run
+    created_home_data_dirs = set()
+
     # Process each image
     processed_count = 0
     failed_count = 0
-    posted_count = 0
     output_paths = []
 
-    # Get timezone for timestamps
-    hong_kong_tz = pytz.timezone('Asia/Hong_Kong')
-
     for idx, image_path in enumerate(image_files, 1):
         try:
-            print(f"\n{'='*60}")
-            print(f"[PROCESSING] ({idx}/{len(image_files)}) {image_path}")
-            print(f"{'='*60}")
-
-            # Determine output path if output directory is specified
-            output_path = None
-            if args.output_dir:
-                output_dir = Path(args.output_dir)
-                output_dir.mkdir(parents=True, exist_ok=True)
-
-                # Get input filename and add _annotated suffix
-                input_filename = Path(image_path).name
-                name_parts = input_filename.rsplit('.', 1)
-                if len(name_parts) == 2:
-                    output_filename = f"{name_parts[0]}_annotated.{name_parts[1]}"
-                else:
-                    output_filename = f"{input_filename}_annotated.jpg"
-
-                output_path = str(output_dir / output_filename)
+            logger.info("\n%s\n[PROCESSING] (%d/%d) %s\n%s", '=' * 60, idx, len(image_files), image_path, '=' * 60)
 
-            # Process and annotate the image
-            result_path = describer.process_and_annotate(image_path, output_path=output_path)
+            # Wait for this image's annotation (already running on the executor)
+            output_path = image_output_paths[idx - 1]
+            result_path, ai_text = descriptions[idx - 1].result()
             output_paths.append(result_path)
 
             processed_count += 1
-            print(f"[SUCCESS] Annotated image saved to: {result_path}")
+            logger.info("[SUCCESS] Annotated image saved to: %s", result_path)
+
+            # One timestamp per image, shared by the copy and the post
+            current_time = datetime.now(HONG_KONG_TZ)
 
             # Save additional copy to /home/data/ directory
             try:
                 import subprocess
-                current_time = datetime.now(hong_kong_tz)
-                year = current_time.strftime('%Y')
-                month = current_time.strftime('%m')
-                day = current_time.strftime('%d')
-                hour = current_time.strftime('%H')
 
-                # Determine the actual file path
+                # Determine the actual file path and its /home/data/pics/AI/yyyy/mm/dd/hh/images directory
                 if output_path:
                     # If output_path was provided, result_path is the actual file path
                     actual_file_path = result_path
+                    year, month, day, hour = current_time.strftime('%Y %m %d %H').split()
+                    home_data_dir = Path("/home/data/pics/AI") / year / month / day / hour / "images"
                 else:
-                    # If no output_path, file is in output/yyyy/mm/dd/hh/images/
-                    actual_file_path = f"output/{year}/{month}/{day}/{hour}/images/{Path(result_path).name}"
+                    # If no output_path, result_path is AI/yyyy/mm/dd/hh/images/<name> for the hour the
+                    # describer saved it in, and the file is under output/yyyy/mm/dd/hh/images/
+                    relative_path = Path(result_path).relative_to("AI")
+                    actual_file_path = str(Path("output") / relative_path)
+                    home_data_dir = Path("/home/data/pics/AI") / relative_path.parent
 
-                # Create hierarchical directory structure: /home/data/pics/AI/yyyy/mm/dd/hh/images
-                home_data_dir = Path("/home/data/pics/AI") / year / month / day / hour / "images"
-
-                # Use sudo to create directory and copy file
-                subprocess.run(['sudo', 'mkdir', '-p', str(home_data_dir)], check=True)
+                # Use sudo to create directory (once per hour directory) and copy file
+                if home_data_dir not in created_home_data_dirs:
+                    subprocess.run(['sudo', 'mkdir', '-p', str(home_data_dir)], check=True)
+                    created_home_data_dirs.add(home_data_dir)
 
                 # Get filename from result_path
                 filename = Path(result_path).name
@@ -304,48 +452,40 @@ Examples:
 
                 # Copy the file using sudo
                 subprocess.run(['sudo', 'cp', actual_file_path, str(home_data_path)], check=True)
-                print(f"[SUCCESS] Additional copy saved to: {home_data_path}")
+                logger.info("[SUCCESS] Additional copy saved to: %s", home_data_path)
             except subprocess.CalledProcessError as e:
-                print(f"[WARNING] Failed to save additional copy to /home/data/ (sudo command failed): {e}")
+                logger.warning("[WARNING] Failed to save additional copy to /home/data/ (sudo command failed): %s", e)
             except Exception as copy_error:
-                print(f"[WARNING] Failed to save additional copy to /home/data/: {copy_error}")
+                logger.warning("[WARNING] Failed to save additional copy to /home/data/: %s", copy_error)
 
             # Post to server if enabled
             if args.post_to_server:
-                current_time = datetime.now(hong_kong_tz)
-                post_data = {
-                    "model_type": "ai_description",
-                    "time": current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "robot": args.robot_name,
-                    "camera": args.camera_name,
-                    "pose": get_robot_pose(),
-                    "image_path": [result_path],
-                    "aiText": describer.ai_text  # Add AI-generated text description
-                }
-
-                # Print endpoint and data to console with formatting
-                print(f"\n{'='*60}")
-                print(f"[POST REQUEST]")
-                print(f"{'='*60}")
-                print(f"Endpoint: {post_endpoint}")
-                print(f"JSON Data:")
-                import json
-                print(json.dumps(post_data, indent=2, ensure_ascii=False))
-                print(f"{'='*60}\n")
-
-                if post_json_data(post_data, post_endpoint, timeout=api_timeout):
-                    posted_count += 1
-                    print(f"[SUCCESS] Posted result to server")
-                else:
-                    print(f"[WARNING] Failed to post result to server")
+                post_data = post_template.copy()
+                post_data["time"] = current_time.strftime("%Y-%m-%d %H:%M:%S")
+                post_data["image_path"] = [result_path]
+                post_data["aiText"] = ai_text  # Add AI-generated text description
+
+                # Log endpoint, and the full payload in verbose mode
+                logger.info("[POST REQUEST] Endpoint: %s", post_endpoint)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("JSON Data:\n%s", json.dumps(post_data, indent=2, ensure_ascii=False))
+
+                # Sent by the post worker; the loop moves on to the next image
+                post_queue.put(post_data)
 
         except Exception as e:
-            print(f"[ERROR] Failed to process {image_path}: {e}")
-            if args.verbose:
-                import traceback
-                traceback.print_exc()
+            logger.error("[ERROR] Failed to process %s: %s", image_path, e, exc_info=args.verbose)
             failed_count += 1
 
+    executor.shutdown()
+    read_pool.shutdown()
+
+    # Wait for queued posts to finish
+    post_queue.put(None)
+    if post_thread is not None:
+        post_thread.join()
+    posted_count = sum(post_results)
+
     # Summary
     print(f"\n{'='*60}")
     print(f"[SUMMARY] Processing complete")
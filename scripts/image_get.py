@@ -1,16 +1,86 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.connection import HTTPConnection
+import socket
 import json
+import logging
+import hashlib
 from datetime import datetime, timedelta
 import threading
 import time
-import pytz
+from zoneinfo import ZoneInfo
 import os
+from collections import deque
+import re
+from functools import lru_cache
+
+HONG_KONG_TZ = ZoneInfo('Asia/Hong_Kong')  # GMT+8, resolved once
+# Capture timestamp in a picture URL: .../YYYYMMDDHHMMSS<ms>-... (group 1 is YYYYMMDDHHMMSS)
+URL_TIMESTAMP_RE = re.compile(r'/(\d{14})\d*-')
+# API messages that mean the token is no longer accepted
+TOKEN_EXPIRED_RE = re.compile(r'token|unauthorized|expired|invalid|未授权|过期', re.IGNORECASE)
+
+TOKEN_REFRESH_RETRIES = 1  # Requests re-sent after refreshing tokens, per get_clockout_list call
+
+# Pooled API sockets keep urllib3's TCP_NODELAY and add TCP keepalive so idle connections survive between polls
+SOCKET_OPTIONS = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+if hasattr(socket, 'TCP_KEEPIDLE'):  # Linux; other platforms keep the OS idle time
+    SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60))
+
+# Monitor loop progress; the application configures handlers and level
+logger = logging.getLogger("image_get")
+
+# Responses are decoded straight from bytes with orjson when it is installed
+# (orjson.JSONDecodeError subclasses json.JSONDecodeError, so one except clause covers both)
+try:
+    from orjson import loads as decode_json
+except ImportError:
+    decode_json = json.loads
+
+
+@lru_cache(maxsize=8192)
+def url_timestamp_digits(pic_url):
+    """
+    Return the YYYYMMDDHHMMSS digits of a picture URL, or None
+    Cached because each poll returns mostly the same URLs as the last one
+    """
+    match = URL_TIMESTAMP_RE.search(pic_url)
+    return match.group(1) if match else None
+
+
+def parse_url_timestamp(pic_url):
+    """
+    Parse the capture time from a picture URL
+    Format: .../YYYYMMDD/HH/YYYYMMDDHHMMSS-...
+
+    Returns:
+        Timezone-aware datetime in GMT+8, or None if the URL has no valid timestamp
+    """
+    digits = url_timestamp_digits(pic_url)
+    if digits is None:
+        return None
+    try:
+        naive = datetime.strptime(digits, "%Y%m%d%H%M%S")
+    except ValueError:
+        return None
+    return naive.replace(tzinfo=HONG_KONG_TZ)
+
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections are opened with SOCKET_OPTIONS
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault('socket_options', SOCKET_OPTIONS)
+        super().init_poolmanager(*args, **kwargs)
+
 
 class ClockOutReader:
     """
     Class to read and monitor clock out data from the API
     """
-    def __init__(self, vin=None, dept_id=None, page_size=50, filter_mode='day', token_file='tokens.json', base_url=None, credentials=None):
+    def __init__(self, vin=None, dept_id=None, page_size=50, filter_mode='day', token_file='tokens.json', base_url=None, credentials=None, max_urls=10000):
         # Use environment variables if not provided
         self.vin = vin if vin is not None else os.getenv('ROBOT_NAME', 'as00212')
         self.dept_id = dept_id if dept_id is not None else int(os.getenv('DEPT_ID', '10'))
@@ -20,22 +90,52 @@ class ClockOutReader:
         self.filter_mode = filter_mode  # 'day' or 'hour'
         self.token_file = token_file
         self.credentials = credentials  # Dict with 'username' and 'password' (required for auto token extraction)
-        self.running = False
         self.thread = None
-        self.latest_urls = []
-        self.all_urls = []  # Stores all URLs collected over time
+        self._stop_event = threading.Event()  # Set to wake the monitor loop and stop it
+        self.latest_urls = ()  # Tuple snapshot of the last poll, replaced wholesale so readers need no lock
+        self.all_urls = deque(maxlen=max_urls)  # URLs collected over time (oldest dropped past max_urls)
+        self._all_urls_snapshot = ()  # Tuple copy of all_urls, republished after each change
+        self._all_pic_urls = set()  # picUrls in all_urls, for O(1) duplicate checks
         self.lock = threading.Lock()
-        self.timezone = pytz.timezone('Asia/Hong_Kong')  # GMT+8
+        self.timezone = HONG_KONG_TZ
         self.token_expired = False
+        self._token_lock = threading.Lock()  # Only one token extraction (Selenium) runs at a time
+        self._token_gen = 0  # Bumped on each successful extraction
+        self._extractor = None  # TokenExtractor kept between refreshes so Chrome starts once
+        self._saved_tokens = None  # Tokens last read from or written to token_file
+        self.last_response_digest = None  # Digest of the last successful response body
+        self._last_seen = None  # (response digest, day/hour) last parsed by the monitor loop
 
         # Initialize headers with base values (no auth tokens yet)
         self._set_default_headers()
 
-        # Always extract fresh tokens on initialization if credentials are provided
+        # Request URL and the query parameters shared by every page, built once
+        self._url = f"{self.base_url}/api/getClockOutList"
+        self._base_params = {"pageSize": self.page_size, "vin": self.vin, "deptId": self.dept_id}
+
+        # Keep-alive session so polls and page fetches reuse pooled TCP/TLS connections
+        self.session = requests.Session()
+        adapter = KeepAliveAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504))
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Reuse tokens saved by a previous run if the API still accepts them; otherwise extract fresh ones
         if self.credentials:
-            print("[INFO] Acquiring fresh tokens on initialization...")
-            if not self._auto_extract_tokens():
-                raise Exception("Failed to acquire tokens on initialization. Please check your credentials.")
+            accepted = self._probe_tokens() if self._load_tokens_from_file() else False
+            if accepted:
+                print(f"[INFO] Using saved tokens from {self.token_file}")
+            elif accepted is None:
+                # Network error or server fault: the tokens may be fine, so don't start a browser for it
+                print(f"[WARNING] Could not verify saved tokens from {self.token_file}; using them unverified")
+                print("[WARNING] They will be refreshed automatically if the API rejects them")
+            else:
+                print("[INFO] Acquiring fresh tokens on initialization...")
+                if not self._auto_extract_tokens():
+                    raise Exception("Failed to acquire tokens on initialization. Please check your credentials.")
         else:
             print("[WARNING] No credentials provided. Token extraction will not be automatic.")
             print("[WARNING] You must manually call update_tokens() or the API calls will fail.")
@@ -47,7 +147,8 @@ class ClockOutReader:
 
         self.headers = {
             "Accept": "application/json, text/plain, */*",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
+            # Only encodings urllib3 can decode here (br/zstd need the brotli/zstandard packages)
+            "Accept-Encoding": ACCEPT_ENCODING,
             "Accept-Language": "en-US,en;q=0.9",
             "Connection": "keep-alive",
             "Host": host,
@@ -84,9 +185,70 @@ class ClockOutReader:
             self.headers['Referer'] = f"https://{host}/new-alarm-handle"
             print(f"[INFO] Host updated to {host}")
 
-    def _auto_extract_tokens(self):
+    def _load_tokens_from_file(self):
+        """
+        Apply tokens saved in token_file by an earlier extraction
+        Returns True if an X-Token or Cookie was loaded
+        """
+        try:
+            with open(self.token_file, 'rb') as f:
+                tokens = decode_json(f.read())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Could not read saved tokens from {self.token_file}: {e}")
+            return False
+
+        if not isinstance(tokens, dict) or not (tokens.get('x_token') or tokens.get('cookie')):
+            return False
+        self._saved_tokens = tokens
+        self.update_tokens(x_token=tokens.get('x_token'), cookie=tokens.get('cookie'), host=tokens.get('host'))
+        return True
+
+    def _probe_tokens(self):
+        """
+        Check the current tokens with one page request, without refreshing them
+        or updating last_response_digest
+        Returns True if accepted, False if rejected as unauthorized or expired,
+        and None if the request failed for another reason
         """
-        Automatically extract fresh tokens using TokenExtractor
+        end_time = datetime.now(self.timezone)
+        params = {
+            "pageNo": 1, **self._base_params,
+            "startTime": self._fmt_api_time(end_time - timedelta(days=1)),
+            "endTime": self._fmt_api_time(end_time),
+        }
+        try:
+            response = self.session.get(self._url, params=params, headers=self.headers, timeout=30)
+            if response.status_code in (401, 403):
+                return False
+            response.raise_for_status()
+            data = decode_json(response.content)
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            print(f"[WARNING] Token probe failed: {e}")
+            return None
+        return not self._check_token_expiration(data)
+
+    def _auto_extract_tokens(self, seen_gen=None):
+        """
+        Automatically extract fresh tokens, coalescing concurrent refreshes
+        seen_gen is the token generation the caller's failed request used; if another
+        thread has refreshed since then, its tokens are reused instead of extracting again
+        Returns True if successful, False otherwise
+        """
+        if seen_gen is None:
+            seen_gen = self._token_gen
+        with self._token_lock:
+            if self._token_gen != seen_gen:
+                return True
+            if not self._extract_tokens():
+                return False
+            self._token_gen += 1
+            return True
+
+    def _extract_tokens(self):
+        """
+        Extract fresh tokens using TokenExtractor
         Returns True if successful, False otherwise
         """
         try:
@@ -108,12 +270,14 @@ class ClockOutReader:
                 return False
 
             print(f"[INFO] Extracting tokens for user: {username}")
-            extractor = TokenExtractor(base_url=self.base_url, headless=True)
-            tokens = extractor.extract_tokens_auto(username, password)
+            if self._extractor is None:
+                self._extractor = TokenExtractor(base_url=self.base_url, headless=True, keep_browser=True)
+            tokens = self._extractor.extract_tokens_auto(username, password)
 
             if tokens:
-                # Save to file
-                save_tokens_to_file(tokens, self.token_file)
+                # Save to file (skipped when the server handed back the tokens already on disk)
+                if tokens != self._saved_tokens and save_tokens_to_file(tokens, self.token_file):
+                    self._saved_tokens = tokens
 
                 # Update current headers
                 if 'x_token' in tokens and tokens['x_token']:
@@ -154,16 +318,21 @@ class ClockOutReader:
         # Common patterns for token expiration
         if isinstance(response_data, dict):
             code = response_data.get('code')
-            msg = str(response_data.get('msg', '')).lower()
+            msg = response_data.get('msg')
 
             # Check for common expiration codes/messages
-            if code in [401, 403, -1]:
+            if code in (401, 403, -1):
                 return True
-            if any(keyword in msg for keyword in ['token', 'unauthorized', 'expired', 'invalid', '未授权', '过期']):
+            if msg and TOKEN_EXPIRED_RE.search(msg if isinstance(msg, str) else str(msg)):
                 return True
 
         return False
 
+    @staticmethod
+    def _fmt_api_time(t):
+        """Format a datetime as the API's YYYY-MM-DD+HH:MM:SS (same as strftime, without format parsing)"""
+        return f"{t.year:04d}-{t.month:02d}-{t.day:02d}+{t.hour:02d}:{t.minute:02d}:{t.second:02d}"
+
     def get_clockout_list(self, page_no=1, start_time=None, end_time=None):
         """
         Get clock out list from the API
@@ -175,91 +344,87 @@ class ClockOutReader:
             start_time = end_time - timedelta(days=1)
 
         # Format times
-        start_str = start_time.strftime("%Y-%m-%d+%H:%M:%S")
-        end_str = end_time.strftime("%Y-%m-%d+%H:%M:%S")
+        start_str = self._fmt_api_time(start_time)
+        end_str = self._fmt_api_time(end_time)
 
         # API endpoint - use the base_url
-        url = f"{self.base_url}/api/getClockOutList"
+        url = self._url
 
         # Parameters
-        params = {
-            "pageNo": page_no,
-            "pageSize": self.page_size,
-            "startTime": start_str,
-            "endTime": end_str,
-            "vin": self.vin,
-            "deptId": self.dept_id
-        }
+        params = {"pageNo": page_no, **self._base_params, "startTime": start_str, "endTime": end_str}
 
-        print(f"[DEBUG] Current time (GMT+8): {datetime.now(self.timezone).strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"[DEBUG] API Request URL: {url}")
-        print(f"[DEBUG] Parameters: {params}")
-        print(f"[DEBUG] Time range: {start_str} to {end_str}")
+        logger.debug("API Request URL: %s", url)
+        logger.debug("Parameters: %s", params)
 
-        try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=30)
-            print(f"[DEBUG] Response status code: {response.status_code}")
-            print(f"[DEBUG] Response content length: {len(response.content)}")
-            print(f"[DEBUG] Response text preview: {response.text[:200]}")
+        for attempt in range(TOKEN_REFRESH_RETRIES + 1):
+            # Tokens this request is sent with, so a refresh already done by another thread isn't repeated
+            token_gen = self._token_gen
 
-            response.raise_for_status()
-
-            # Parse JSON response
-            data = response.json()
-
-            # Check if token expired
-            if self._check_token_expiration(data):
-                print("[WARNING] Token appears to be expired")
-                self.token_expired = True
-
-                # Try to auto-extract new tokens if credentials are available
-                if self.credentials:
-                    if self._auto_extract_tokens():
-                        # Retry the request with new tokens
-                        print("[INFO] Retrying request with new tokens...")
-                        return self.get_clockout_list(page_no, start_time, end_time)
-                    else:
-                        print("[ERROR] Could not refresh tokens automatically")
+            try:
+                # Headers are passed per request so token refreshes apply immediately
+                response = self.session.get(url, params=params, headers=self.headers, timeout=30)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Response status code: %s", response.status_code)
+                    logger.debug("Response content length: %d", len(response.content))
+                    logger.debug("Response preview: %s", response.content[:200])
+
+                response.raise_for_status()
+
+                # Parse JSON response
+                data = decode_json(response.content)
+
+                # Check if token expired
+                if self._check_token_expiration(data):
+                    print("[WARNING] Token appears to be expired")
+                    self.token_expired = True
+                    if not self.credentials:
+                        print("[ERROR] Token expired. Provide credentials or manually refresh tokens")
                         return None
+                    reason = "expired token"
                 else:
-                    print("[ERROR] Token expired. Provide credentials or manually refresh tokens")
+                    self.last_response_digest = hashlib.blake2b(response.content, digest_size=16).digest()
+
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Response keys: %s", data.keys() if data else None)
+                        if data and 'data' in data:
+                            logger.debug("Data keys: %s", data['data'].keys())
+                            rows = data['data'].get('rows')
+                            if rows is not None:
+                                logger.debug("Number of rows: %d", len(rows))
+                                if rows:
+                                    logger.debug("First row sample: %s", rows[0])
+                    return data
+
+            except json.JSONDecodeError as e:
+                print(f"[ERROR] Error parsing JSON: {e}")
+                print(f"[ERROR] Response content: {response.content[:500]}")
+
+                # Empty response might indicate expired token
+                if not self.credentials or self.token_expired:
                     return None
+                reason = "JSON decode error"
+            except requests.exceptions.RequestException as e:
+                print(f"[ERROR] Error making request: {e}")
+                print(f"[ERROR] Response content (if available): {getattr(e.response, 'text', 'N/A')}")
 
-            print(f"[DEBUG] Response keys: {data.keys() if data else 'None'}")
-            if data and 'data' in data:
-                print(f"[DEBUG] Data keys: {data['data'].keys()}")
-                if 'rows' in data['data']:
-                    print(f"[DEBUG] Number of rows: {len(data['data']['rows'])}")
-                    if len(data['data']['rows']) > 0:
-                        print(f"[DEBUG] First row sample: {data['data']['rows'][0]}")
-                        print(f"[DEBUG] First row keys: {data['data']['rows'][0].keys()}")
-            return data
-
-        except json.JSONDecodeError as e:
-            print(f"[ERROR] Error parsing JSON: {e}")
-            print(f"[ERROR] Response text: {response.text[:500]}")
-
-            # Empty response might indicate expired token
-            if self.credentials and not self.token_expired:
-                print("[INFO] Attempting token refresh due to JSON decode error...")
-                if self._auto_extract_tokens():
-                    return self.get_clockout_list(page_no, start_time, end_time)
-
-            return None
-        except requests.exceptions.RequestException as e:
-            print(f"[ERROR] Error making request: {e}")
-            print(f"[ERROR] Response content (if available): {getattr(e.response, 'text', 'N/A')}")
+                # 401/403 status codes indicate auth issues
+                if getattr(e.response, 'status_code', None) not in (401, 403) or not self.credentials or self.token_expired:
+                    return None
+                reason = "authentication error"
 
-            # 401/403 status codes indicate auth issues
-            if hasattr(e.response, 'status_code') and e.response.status_code in [401, 403]:
-                if self.credentials and not self.token_expired:
-                    print("[INFO] Attempting token refresh due to authentication error...")
-                    if self._auto_extract_tokens():
-                        return self.get_clockout_list(page_no, start_time, end_time)
+            if attempt == TOKEN_REFRESH_RETRIES:
+                break
+            # Try to auto-extract new tokens, then retry the request with them
+            print(f"[INFO] Attempting token refresh due to {reason}...")
+            if not self._auto_extract_tokens(token_gen):
+                print("[ERROR] Could not refresh tokens automatically")
+                return None
+            print("[INFO] Retrying request with new tokens...")
 
-            return None
+        print("[ERROR] Request still rejected after refreshing tokens")
+        return None
 
-    def get_filtered_urls(self, result, filter_mode='day'):
+    def get_filtered_urls(self, result, filter_mode='day', now=None):
         """
         Extract URLs and location data from API result based on filter mode
         Parses timestamp from URL format: .../YYYYMMDD/HH/YYYYMMDDHHMMSS-...
@@ -267,90 +432,50 @@ class ClockOutReader:
         Args:
             result: API result containing rows with picUrl, lon, lat, clockOutPlace
             filter_mode: 'day' for same day, 'hour' for same hour (default: 'day')
+            now: Current GMT+8 time, if the caller already has it (default: read the clock)
 
         Returns:
             List of dictionaries with keys: 'picUrl', 'lon', 'lat', 'clockOutPlace'
         """
+        filtered_data = list(self.iter_filtered_urls(result, filter_mode, now))
+        logger.debug("Filtered data for %s: %d", filter_mode, len(filtered_data))
+        return filtered_data
+
+    def iter_filtered_urls(self, result, filter_mode='day', now=None):
+        """
+        Yield the items of get_filtered_urls one at a time, so callers can filter
+        and consume rows in a single pass
+        """
         if not result or 'data' not in result or 'rows' not in result['data']:
-            print("[DEBUG] No result data or rows found")
-            return []
+            logger.debug("No result data or rows found")
+            return
 
         # Use GMT+8 timezone
-        current_datetime = datetime.now(self.timezone)
-        current_year = current_datetime.year
-        current_month = current_datetime.month
-        current_day = current_datetime.day
-        current_hour = current_datetime.hour
+        current_datetime = now if now is not None else datetime.now(self.timezone)
 
+        # URL timestamps match when they start with the current YYYYMMDD (day) or YYYYMMDDHH (hour)
         if filter_mode == 'hour':
-            print(f"[DEBUG] Filtering for same hour (GMT+8): {current_year}-{current_month:02d}-{current_day:02d} {current_hour:02d}:00")
+            prefix = current_datetime.strftime('%Y%m%d%H')
         else:  # filter_mode == 'day'
-            print(f"[DEBUG] Filtering for same day (GMT+8): {current_year}-{current_month:02d}-{current_day:02d}")
-
-        filtered_data = []
-        total_urls = 0
+            prefix = current_datetime.strftime('%Y%m%d')
+        logger.debug("Filtering %d rows for same %s (GMT+8): %s", len(result['data']['rows']), filter_mode, prefix)
 
         for row in result['data']['rows']:
-            if 'picUrl' not in row:
+            pic_url = row.get('picUrl')
+            if pic_url is None:
                 continue
 
-            pic_url = row['picUrl']
-            total_urls += 1
-
-            try:
-                # Extract timestamp from URL
-                # Format: .../YYYYMMDD/HH/YYYYMMDDHHMMSS-...
-                parts = pic_url.split('/')
-
-                # Find the timestamp part (YYYYMMDDHHMMSS-...)
-                timestamp_part = None
-                for part in parts:
-                    if '-' in part and len(part.split('-')[0]) >= 14:
-                        timestamp_part = part.split('-')[0]
-                        break
-
-                if not timestamp_part or len(timestamp_part) < 10:
-                    print(f"[DEBUG] Skipping URL (no valid timestamp): {pic_url[:100]}")
-                    continue
-
-                # Parse timestamp: YYYYMMDDHHMMSS
-                url_year = int(timestamp_part[0:4])
-                url_month = int(timestamp_part[4:6])
-                url_day = int(timestamp_part[6:8])
-                url_hour = int(timestamp_part[8:10])
-
-                # Check based on filter mode
-                if filter_mode == 'hour':
-                    match = (url_year == current_year and
-                            url_month == current_month and
-                            url_day == current_day and
-                            url_hour == current_hour)
-                    print(f"[DEBUG] URL timestamp: {url_year}-{url_month:02d}-{url_day:02d} {url_hour:02d}:00 | Match: {match}")
-                else:  # filter_mode == 'day'
-                    match = (url_year == current_year and
-                            url_month == current_month and
-                            url_day == current_day)
-                    print(f"[DEBUG] URL timestamp: {url_year}-{url_month:02d}-{url_day:02d} {url_hour:02d}:00 | Match: {match}")
-
-                if match:
-                    # Extract location data
-                    item = {
-                        'picUrl': pic_url,
-                        'lon': row.get('lon'),
-                        'lat': row.get('lat'),
-                        'clockOutPlace': row.get('clockOutPlace')
-                    }
-                    filtered_data.append(item)
-
-            except (ValueError, IndexError) as e:
-                # Skip URLs that don't match expected format
-                print(f"[DEBUG] Error parsing URL: {e} | URL: {pic_url[:100]}")
-                continue
-
-        print(f"[DEBUG] Total URLs in response: {total_urls}")
-        print(f"[DEBUG] Filtered data for {filter_mode}: {len(filtered_data)}")
-
-        return filtered_data
+            # Extract timestamp from URL
+            # Format: .../YYYYMMDD/HH/YYYYMMDDHHMMSS-...
+            timestamp = url_timestamp_digits(pic_url)
+            if timestamp and timestamp.startswith(prefix):
+                # Extract location data
+                yield {
+                    'picUrl': pic_url,
+                    'lon': row.get('lon'),
+                    'lat': row.get('lat'),
+                    'clockOutPlace': row.get('clockOutPlace')
+                }
 
     def get_current_hour_urls(self, result):
         """
@@ -368,20 +493,51 @@ class ClockOutReader:
         """
         Background monitoring loop
         """
-        while self.running:
-            result = self.get_clockout_list()
-            if result:
-                data_items = self.get_filtered_urls(result, filter_mode=self.filter_mode)
+        while not self._stop_event.is_set():
+            # One clock reading per poll: the query's end time, the day/hour filter and the log line
+            now = datetime.now(self.timezone)
+            result = self.get_clockout_list(end_time=now)
+            # Same response body in the same day/hour filters to the same items; skip re-parsing it
+            seen = (self.last_response_digest, now.strftime('%Y%m%d%H' if self.filter_mode == 'hour' else '%Y%m%d'))
+            if result and seen == self._last_seen:
+                logger.info("[%s GMT+8] No changes since last poll (Total: %d)", now.strftime('%Y-%m-%d %H:%M:%S'), len(self.all_urls))
+            elif result:
+                self._last_seen = seen
+                # Filter rows and pick out unseen items in one pass, outside the lock
+                # (the set lookup is only a pre-check; it is repeated under the lock)
+                data_items = []
+                new_items = []
+                for item in self.iter_filtered_urls(result, filter_mode=self.filter_mode, now=now):
+                    data_items.append(item)
+                    if item['picUrl'] not in self._all_pic_urls:
+                        new_items.append(item)
                 with self.lock:
-                    self.latest_urls = data_items
                     # Add new items to all_urls (avoid duplicates based on picUrl)
-                    existing_pic_urls = {item['picUrl'] for item in self.all_urls}
-                    for item in data_items:
-                        if item['picUrl'] not in existing_pic_urls:
+                    for item in new_items:
+                        if item['picUrl'] not in self._all_pic_urls:
+                            if len(self.all_urls) == self.all_urls.maxlen:
+                                # The deque is about to drop its oldest item; keep the set in step
+                                self._all_pic_urls.discard(self.all_urls[0]['picUrl'])
                             self.all_urls.append(item)
-                            existing_pic_urls.add(item['picUrl'])
-                print(f"[{datetime.now(self.timezone).strftime('%Y-%m-%d %H:%M:%S')} GMT+8] Found {len(data_items)} items for current {self.filter_mode} (Total: {len(self.all_urls)})")
-            time.sleep(interval)
+                            self._all_pic_urls.add(item['picUrl'])
+                    self.latest_urls = tuple(data_items)
+                    if new_items:
+                        self._all_urls_snapshot = tuple(self.all_urls)
+                logger.info("[%s GMT+8] Found %d items for current %s (Total: %d)", now.strftime('%Y-%m-%d %H:%M:%S'), len(data_items), self.filter_mode, len(self.all_urls))
+            self._stop_event.wait(interval)
+
+    @property
+    def running(self):
+        """True while the monitor thread is alive and has not been asked to stop"""
+        return not self._stop_event.is_set() and self.thread is not None and self.thread.is_alive()
+
+    @running.setter
+    def running(self, value):
+        # Setting running = False asks the monitor loop to stop, as with the old plain attribute
+        if value:
+            self._stop_event.clear()
+        else:
+            self._stop_event.set()
 
     def start_monitoring(self, interval=60):
         """
@@ -391,7 +547,7 @@ class ClockOutReader:
             print("Monitoring already running")
             return
 
-        self.running = True
+        self._stop_event.clear()
         self.thread = threading.Thread(target=self._monitor_loop, args=(interval,), daemon=True)
         self.thread.start()
         print(f"Started monitoring (checking every {interval} seconds)")
@@ -404,24 +560,38 @@ class ClockOutReader:
             print("Monitoring not running")
             return
 
-        self.running = False
-        if self.thread:
-            self.thread.join(timeout=5)
+        self._stop_event.set()
+        # The loop wakes from its wait immediately; an in-flight request or token extraction is not waited out
+        self.thread.join(timeout=5)
+        if self.thread.is_alive():
+            # Leave the session and browser to the (daemon) thread still using them
+            print("Monitoring stopping after the current request")
+            return
+        self.close()
         print("Stopped monitoring")
 
+    def close(self):
+        """
+        Close pooled HTTP connections (the session reconnects if used again)
+        and the browser kept for token extraction
+        """
+        self.session.close()
+        if self._extractor is not None:
+            self._extractor.quit()
+
     def get_latest_urls(self):
         """
         Get the latest URLs from background monitoring
+        Returns a new list copied from the lock-free snapshot, so callers may modify it
         """
-        with self.lock:
-            return self.latest_urls.copy()
+        return list(self.latest_urls)
 
     def get_all_urls(self):
         """
         Get all URLs collected from monitoring
+        Returns a new list copied from the lock-free snapshot, so callers may modify it
         """
-        with self.lock:
-            return self.all_urls.copy()
+        return list(self._all_urls_snapshot)
 
     def clear_all_urls(self):
         """
@@ -429,9 +599,14 @@ class ClockOutReader:
         """
         with self.lock:
             self.all_urls.clear()
+            self._all_pic_urls.clear()
+            self._all_urls_snapshot = ()
+            self._last_seen = None  # Re-collect on the next poll even if the response is unchanged
 
 # Usage example
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
     # Example 1: With automatic token extraction (recommended)
     # Tokens will be acquired fresh on initialization
     credentials = {
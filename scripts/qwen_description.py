@@ -1,7 +1,32 @@
-import pytz
-from qwen_llm import qwen_llm
+from zoneinfo import ZoneInfo
+from qwen_llm import qwen_llm, load_image_bytes, prefetch_image, release_image
 from PIL import Image, ImageDraw, ImageFont
 
+HONG_KONG_TZ = ZoneInfo('Asia/Hong_Kong')  # GMT+8, resolved once
+
+# Fixed JPEG encoder settings: visually lossless, no extra optimize/progressive passes
+JPEG_SUFFIXES = ('.jpg', '.jpeg')
+JPEG_SAVE_OPTIONS = {'format': 'JPEG', 'quality': 85, 'subsampling': 2, 'optimize': False, 'progressive': False}
+
+# Chinese names used when asking the model about detection objects
+OBJECTS_CHINESE = {
+    "pets": "寵物",
+    "rubbish": "垃圾",
+    "water puddle": "水坑",
+    "smoker": "吸煙者",
+    "pet not leashed": "寵物未牽繩",
+    "pets that are not leashed": "寵物未牽繩",
+    "person on skateboard": "滑板人士",
+    "person on bicycle": "騎自行車人士",
+    "person playing ball game": "打球人士",
+    "person injured": "受傷人士",
+    "unattended object": "無人看管物品",
+    "unclosed doors": "未關門",
+    "bicycle": "自行車",
+    "violent actions": "暴力行為",
+    "opened gate": "打开的门"
+}
+
 
 class QwenDescriber:
     """
@@ -23,6 +48,7 @@ class QwenDescriber:
         self.language = language.lower()
         self.text_alignment = text_alignment.lower()  # "left" or "right"
         self.security_prompt = self._load_prompt()
+        self.filter_question = self._build_filter_question()
         self.font_header = None
         self.font_body = None
         self._load_fonts()
@@ -43,6 +69,18 @@ class QwenDescriber:
             print(f"[ERROR] Failed to load prompt file: {e}")
             raise
 
+    def _build_filter_question(self):
+        """Build the object pre-filtering question; it only depends on the detection objects and language"""
+        # Translate detection objects to Chinese if needed
+        detection_objects_for_query = self.detection_objects
+        if self.language == "chinese":
+            detection_objects_for_query = [OBJECTS_CHINESE.get(obj, obj) for obj in self.detection_objects]
+
+        # Use simple pre-filtering prompt to check if objects exist
+        if self.language == "chinese":
+            return f"圖像中是否存在以下任何物體？{detection_objects_for_query} 如果存在，請列出存在的物體。只返回存在的物體列表，格式：['物體1', '物體2'] 如果沒有則返回 []"
+        return f"Are any of the following objects present in the image? {detection_objects_for_query} If yes, list which ones exist. Return only a list of existing objects in format: ['object1', 'object2'] or [] if none"
+
     def _load_fonts(self):
         """Load fonts for image annotation"""
         import os
@@ -202,6 +240,19 @@ class QwenDescriber:
         return wrapped
 
 
+    def process_and_annotate_bytes(self, image_bytes, source_url, output_path=None):
+        """
+        Same as process_and_annotate, for an image whose bytes were already downloaded
+        Args:
+            image_bytes: Raw image file contents
+            source_url: URL (or path) the bytes came from, used for naming and logging
+            output_path: Optional output path for annotated image
+        Returns:
+            Path to annotated image
+        """
+        prefetch_image(source_url, image_bytes)
+        return self.process_and_annotate(source_url, output_path=output_path)
+
     def process_and_annotate(self, image_path, output_path=None):
         """
         Process an image and generate annotated version with security observations
@@ -215,6 +266,9 @@ class QwenDescriber:
         try:
             print(f"[DEBUG] Starting image processing: {image_path}")
 
+            # Download once; every model call and the annotation reuse these bytes
+            prefetch_image(image_path)
+
             # Get initial security observations
             print("[DEBUG] Step 1: Getting security observations...")
             self.describer.action(
@@ -231,36 +285,7 @@ class QwenDescriber:
             self.detected_obj_list = []
             self.unique_labels = set()  # Reset unique labels for each new image
 
-            # Translate detection objects to Chinese if needed
-            detection_objects_for_query = self.detection_objects
-            if self.language == "chinese":
-                objects_chinese = {
-                    "pets": "寵物",
-                    "rubbish": "垃圾",
-                    "water puddle": "水坑",
-                    "smoker": "吸煙者",
-                    "pet not leashed": "寵物未牽繩",
-                    "pets that are not leashed": "寵物未牽繩",
-                    "person on skateboard": "滑板人士",
-                    "person on bicycle": "騎自行車人士",
-                    "person playing ball game": "打球人士",
-                    "person injured": "受傷人士",
-                    "unattended object": "無人看管物品",
-                    "unclosed doors": "未關門",
-                    "bicycle": "自行車",
-                    "violent actions": "暴力行為",
-                    "violent actions": "暴力行為",
-		            "opened gate": "打开的门"
-                }
-                detection_objects_for_query = [objects_chinese.get(obj, obj) for obj in self.detection_objects]
-
-            # Use simple pre-filtering prompt to check if objects exist
-            if self.language == "chinese":
-                filter_question = f"圖像中是否存在以下任何物體？{detection_objects_for_query} 如果存在，請列出存在的物體。只返回存在的物體列表，格式：['物體1', '物體2'] 如果沒有則返回 []"
-            else:
-                filter_question = f"Are any of the following objects present in the image? {detection_objects_for_query} If yes, list which ones exist. Return only a list of existing objects in format: ['object1', 'object2'] or [] if none"
-
-            self.describer.action(image=image_path, question=filter_question)
+            self.describer.action(image=image_path, question=self.filter_question)
 
             # Parse the filtered list
             filtered_objects = []
@@ -372,6 +397,8 @@ class QwenDescriber:
             import traceback
             traceback.print_exc()
             raise
+        finally:
+            release_image(image_path)
 
     def _annotate_image(self, image_path, points, output_path=None, preloaded_img=None):
         """
@@ -390,18 +417,18 @@ class QwenDescriber:
             print(f"[DEBUG] Using pre-loaded image with detections...")
             img = preloaded_img
         elif image_path.startswith(('http://', 'https://')):
-            import requests
             from io import BytesIO
             print(f"[DEBUG] Downloading image from URL...")
-            response = requests.get(image_path)
-            print(f"[DEBUG] Download complete. Status: {response.status_code}")
-            img = Image.open(BytesIO(response.content))
+            img = Image.open(BytesIO(load_image_bytes(image_path)))
+            print(f"[DEBUG] Download complete")
         else:
             print(f"[DEBUG] Loading local image file...")
             img = Image.open(image_path)
 
         print(f"[DEBUG] Image loaded. Size: {img.size}")
         img_width, img_height = img.size
+        # Promote to RGBA once for compositing the text box overlays
+        img = img.convert('RGBA')
         draw = ImageDraw.Draw(img)
 
         # Track the vertical position for stacking text boxes
@@ -505,7 +532,6 @@ class QwenDescriber:
             )
 
             # Composite the overlay onto the original image
-            img = img.convert('RGBA')
             img = Image.alpha_composite(img, overlay)
 
             draw = ImageDraw.Draw(img)
@@ -557,7 +583,7 @@ class QwenDescriber:
             from datetime import datetime
 
             # Get current timestamp
-            now = datetime.now(pytz.timezone('Asia/Hong_Kong'))
+            now = datetime.now(HONG_KONG_TZ)
             year = now.strftime('%Y')
             month = now.strftime('%m')
             day = now.strftime('%d')
@@ -610,7 +636,10 @@ class QwenDescriber:
         print(f"[DEBUG] Saving image to: {output_path}")
 
         try:
-            img.save(output_path)
+            if output_path.lower().endswith(JPEG_SUFFIXES):
+                img.save(output_path, **JPEG_SAVE_OPTIONS)
+            else:
+                img.save(output_path)
             print(f"[SUCCESS] Image saved to {output_path}")
 
             # Verify file was created
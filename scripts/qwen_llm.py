@@ -3,12 +3,60 @@ import base64
 import os
 
 import json
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 
 from PIL import Image as PIL_Image
 from PIL import ImageDraw
 from io import BytesIO
 
+# Shared HTTP session so image downloads reuse pooled TCP/TLS connections
+_http_session = requests.Session()
+_http_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+_http_session.mount('http://', _http_adapter)
+_http_session.mount('https://', _http_adapter)
+
+# Raw image bytes fetched ahead of time, keyed by image path/URL
+_image_cache = {}
+# Base64 of prefetched images; one image is sent to the model several times
+_encoded_cache = {}
+_image_cache_lock = threading.Lock()
+
+
+def load_image_bytes(image_path):
+    """Return raw image bytes from a URL or local file, using the prefetch cache if populated"""
+    with _image_cache_lock:
+        data = _image_cache.get(image_path)
+    if data is not None:
+        return data
+
+    if image_path.startswith(('http://', 'https://')):
+        response = _http_session.get(image_path, timeout=30)
+        response.raise_for_status()  # Raise exception for bad status codes
+        return response.content
+    with open(image_path, "rb") as image_file:
+        return image_file.read()
+
+
+def prefetch_image(image_path, data=None):
+    """
+    Load an image into the cache so later reads of the same path skip the download
+    If data is given (bytes already downloaded elsewhere), it is cached as-is
+    """
+    if data is None:
+        data = load_image_bytes(image_path)
+    with _image_cache_lock:
+        _image_cache[image_path] = data
+    return data
+
+
+def release_image(image_path):
+    """Drop a prefetched image from the cache"""
+    with _image_cache_lock:
+        _image_cache.pop(image_path, None)
+        _encoded_cache.pop(image_path, None)
+
 
 class qwen_llm():
 
@@ -25,15 +73,18 @@ class qwen_llm():
         self.response=""
 
     def encode_image(self,image_path):
-        if image_path.startswith(('http://', 'https://')):
-            # Handle HTTP/HTTPS URLs
-            response = requests.get(image_path)
-            response.raise_for_status()  # Raise exception for bad status codes
-            return base64.b64encode(response.content).decode("utf-8")
-        else:
-            # Handle local file paths
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode("utf-8")
+        # Handles both HTTP/HTTPS URLs and local file paths
+        with _image_cache_lock:
+            encoded = _encoded_cache.get(image_path)
+        if encoded is not None:
+            return encoded
+
+        encoded = base64.b64encode(load_image_bytes(image_path)).decode("utf-8")
+        # Only prefetched images are kept; release_image drops both entries together
+        with _image_cache_lock:
+            if image_path in _image_cache:
+                _encoded_cache[image_path] = encoded
+        return encoded
         
     def extract_json_from_string(self,text: str) -> str:
         try:
@@ -59,11 +110,7 @@ class qwen_llm():
             return text
 
     def draw_normalized_bounding_boxes(self,image_path: str, llm_output_string: str):
-        if image_path.startswith(('http', 'https')):
-            response = requests.get(image_path)
-            img = PIL_Image.open(BytesIO(response.content))
-        else:
-            img = PIL_Image.open(image_path)
+        img = PIL_Image.open(BytesIO(load_image_bytes(image_path)))
 
         img_width, img_height = img.size
 
@@ -193,11 +240,7 @@ class qwen_llm():
             return text
 
     def draw_normalized_bounding_boxes(self,image_path: str, llm_output_string: str):
-        if image_path.startswith(('http', 'https')):
-            response = requests.get(image_path)
-            img = PIL_Image.open(BytesIO(response.content))
-        else:
-            img = PIL_Image.open(image_path)
+        img = PIL_Image.open(BytesIO(load_image_bytes(image_path)))
 
         img_width, img_height = img.size
 
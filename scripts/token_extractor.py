@@ -12,7 +12,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 
 
 class TokenExtractor:
@@ -20,12 +20,13 @@ class TokenExtractor:
     Extracts authentication tokens from AIMO web interface
     """
 
-    def __init__(self, base_url=None, headless=False):
+    def __init__(self, base_url=None, headless=False, keep_browser=False):
         # Use environment variable if base_url not provided
         if base_url is None:
             base_url = os.getenv('API_BASE_URL', 'https://hk1.aimo.tech')
         self.base_url = base_url
         self.headless = headless
+        self.keep_browser = keep_browser  # Keep Chrome running between automatic extractions; call quit() when done
         self.driver = None
 
     def _setup_driver(self):
@@ -47,6 +48,32 @@ class TokenExtractor:
         self.driver = webdriver.Chrome(options=chrome_options)
         self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
+    def _reuse_or_setup_driver(self):
+        """
+        Reuse the browser from a previous extraction if it is still alive, otherwise start one
+        Returns True if an existing browser was reused
+        """
+        if self.driver is not None:
+            try:
+                # Log in from a clean session so the login form is shown again
+                self.driver.delete_all_cookies()
+                self.driver.get_log('performance')  # Drop network logs from the previous extraction
+                return True
+            except WebDriverException:
+                self.quit()
+        self._setup_driver()
+        return False
+
+    def quit(self):
+        """Close the browser if one is running"""
+        if self.driver:
+            print("\n[INFO] Closing browser...")
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+            self.driver = None
+
     def extract_tokens_from_logs(self):
         """Extract tokens from browser performance logs"""
         logs = self.driver.get_log('performance')
@@ -187,11 +214,15 @@ class TokenExtractor:
             login_url = f"{self.base_url}/login"
 
         print("[INFO] Setting up browser for automatic login...")
-        self._setup_driver()
+        reused = self._reuse_or_setup_driver()
 
         try:
             print(f"[INFO] Navigating to {login_url}")
             self.driver.get(login_url)
+            if reused:
+                # Tokens left in storage by the previous login would skip the login form
+                self.driver.execute_script("localStorage.clear(); sessionStorage.clear();")
+                self.driver.get(login_url)
 
             # Wait for login form
             print("[INFO] Waiting for login form...")
@@ -323,9 +354,8 @@ class TokenExtractor:
             traceback.print_exc()
             return None
         finally:
-            if self.driver:
-                print("\n[INFO] Closing browser...")
-                self.driver.quit()
+            if not self.keep_browser:
+                self.quit()
 
 
 def save_tokens_to_file(tokens, filename='tokens.json'):
@@ -335,8 +365,11 @@ def save_tokens_to_file(tokens, filename='tokens.json'):
         return False
 
     try:
-        with open(filename, 'w') as f:
+        # Write a temp file and rename it over the old one, so a crash never leaves a truncated file
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, 'w') as f:
             json.dump(tokens, f, indent=2)
+        os.replace(tmp_filename, filename)
         print(f"[SUCCESS] Tokens saved to {filename}")
         return True
     except Exception as e: